@@ -1,51 +1,217 @@
 import asyncio
-from typing import List
+from collections import deque
+from functools import lru_cache
+from typing import AsyncIterable, Deque, Set, Tuple, Union
 import os
 import sys
-import json
+import threading
 from pathlib import Path
-import datetime
-
-# Add the current directory to the Python path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import aiofiles
+import orjson
 
 try:
-    from idea_code import ApplicationSpec, PlatformOrchestrator
+    if __package__:
+        from .idea_code import ApplicationSpec, CopilotResponse, DeploymentResponse, PlatformOrchestrator, flush_logs
+    else:
+        # Run as a script: the script's own directory is already first on sys.path
+        from idea_code import ApplicationSpec, CopilotResponse, DeploymentResponse, PlatformOrchestrator, flush_logs
 except ImportError as e:
     print(f"Error importing modules: {e}")
     sys.exit(1)
 
+def _loads(data):
+    """Parse an agent's JSON response; raises ValueError (orjson.JSONDecodeError) on bad input"""
+    return orjson.loads(data)
+
+# Number of history entries (user and assistant lines) kept for a session
+HISTORY_MAXLEN = 200
+
+# Static reply text; dynamic parts are filled in with str.format_map
+_PROJECT_CREATED = (
+    "I've created a new static website project '{project}' using Pulumi's Azure Go template.\n"
+    "\n🤖 Pulumi Copilot Analysis:\n"
+    "{analysis}\n"
+    "\nAnalysis is being saved to the 'analysis' directory.\n"
+    "\nWould you like me to proceed with deployment? (yes/no)"
+)
+_CREATE_FAILED = "Sorry, I encountered an error while creating the project: {error}"
+_PROJECT_ANALYSIS_FAILED = (
+    "I've created the project '{project}', but the code analysis failed:\n"
+    "{message}\n"
+    "Would you like to proceed with deployment anyway? (yes/no)"
+)
+_PROJECT_ANALYSIS_UNPARSED = (
+    "Project created, but failed to parse the code analysis. "
+    "Would you like to proceed with deployment? (yes/no)"
+)
+_NO_PROJECT_TO_DESTROY = (
+    "There's no active project to destroy. "
+    "Would you like to create a new static website project?"
+)
+_ASK_PROJECT_NAME = (
+    "What would you like to name your project? "
+    "(Please provide a simple name, it will be converted to lowercase with hyphens)"
+)
+_GREETING_WITH_PROJECT = (
+    "I can help you manage your project '{project}'. "
+    "You can ask me to:\n"
+    "• Deploy your application\n"
+    "• Destroy your application\n"
+    "Or create a new static website"
+)
+_GREETING = (
+    "I can help you create and manage static websites on Azure. "
+    "Would you like me to create a simple Go app for a static website? "
+    "Just let me know!"
+)
+
+_WELCOME = """
+🤖 Welcome to the AI Platform Engineering Assistant!
+-----------------------------------------------------
+I can help you create and manage static websites on Azure.
+You can ask me to:
+  • Create a simple Go app for a static website
+  • Deploy your application
+  • Destroy your application
+
+What would you like to do? (type 'exit' to quit)
+-----------------------------------------------------
+"""
+
+# Failures the orchestrator reports by raising: missing credentials (ValueError),
+# failed CLI commands (RuntimeError) and filesystem errors (OSError). Anything else,
+# including cancellation, is a bug and should propagate.
+_HANDLED_ERRORS = (OSError, RuntimeError, ValueError)
+
+# Keywords recognised in user messages for each intent. They match anywhere in the
+# message, so "deployment" or "redeploy" still count as "deploy". A few short 'in'
+# checks beat a single-pass matcher (regex or Aho-Corasick) on chat-sized input
+_DEPLOY_KEYWORDS = ("deploy",)
+_DESTROY_KEYWORDS = ("destroy", "remove", "delete")
+_CREATE_KEYWORDS = ("create",)
+_STATIC_WEBSITE_KEYWORDS = ("static website",)
+_CONFIRM_KEYWORDS = ("yes", "sure", "okay")
+
+def _mentions(message_lower: str, keywords: Tuple[str, ...]) -> bool:
+    """Whether a lowercased message contains any of the keywords"""
+    for keyword in keywords:
+        if keyword in message_lower:
+            return True
+    return False
+
+@lru_cache(maxsize=1)
+def _analysis_dir() -> Path:
+    """Directory for saved analyses, created once per process"""
+    path = Path("analysis")
+    path.mkdir(exist_ok=True)
+    return path
+
 class AIChatInterface:
     """
     Main interface for user interaction with the platform
     Handles conversation flow and command processing
     """
+    __slots__ = (
+        "_orchestrator",
+        "conversation_history",
+        "current_project",
+        "awaiting_project_name",
+        "awaiting_deployment_confirmation",
+        "analysis_dir",
+        "pending_saves",
+    )
+
+    _DESCRIPTION = "A static website with Azure CDN"
+
+    # Reply text for each orchestrator action, picked by how the final status parsed
+    _RESPONSE_TEXT = {
+        "deploy": {
+            "success": "I've deployed your application. Here's what happened:",
+            "failure": "Deployment attempt completed. Here's what happened:",
+            "unparsed": "Deployment completed. Here's what happened:",
+            "default": "Deployment completed successfully",
+            "error": "Sorry, I encountered an error while deploying: {error}",
+        },
+        "destroy": {
+            "success": "I've destroyed your application. Here's what I did:",
+            "failure": "I've attempted to destroy your application. Here's what happened:",
+            "unparsed": "I've attempted to destroy your application. Here's what happened:",
+            "default": "Application destroyed successfully",
+            "error": "Sorry, I encountered an error while destroying the application: {error}",
+        },
+    }
+
     def __init__(self):
-        self.orchestrator = PlatformOrchestrator()
-        self.conversation_history: List[str] = []  # Tracks chat history
+        self._orchestrator = None  # Created on first use, see the orchestrator property
+        self.conversation_history: Deque[str] = deque(maxlen=HISTORY_MAXLEN)  # Tracks recent chat history
         self.current_project = None  # Tracks active project
         self.awaiting_project_name = False  # State flag for project name input
         self.awaiting_deployment_confirmation = False  # State flag for deployment confirmation
-        self.analysis_dir = Path("analysis")  # Directory to store analysis files
-        self.analysis_dir.mkdir(exist_ok=True)  # Create directory if it doesn't exist
+        self.analysis_dir = _analysis_dir()  # Directory to store analysis files
+        self.pending_saves: Set[asyncio.Task] = set()  # Analysis writes still running in the background
+
+    @property
+    def orchestrator(self) -> PlatformOrchestrator:
+        """Platform orchestrator, constructed lazily since it sets up every agent"""
+        if self._orchestrator is None:
+            self._orchestrator = PlatformOrchestrator()
+        return self._orchestrator
+
+    async def save_analysis_to_file(self, project_name: str, analysis: Union[str, AsyncIterable[str]]):
+        """
+        Save Pulumi Copilot analysis to a markdown file without blocking the event loop.
+        The analysis may be a complete string or an async stream of text chunks,
+        which are written as they arrive instead of being joined in memory first.
+        """
+        import datetime  # Only needed once a project has been analysed
 
-    async def save_analysis_to_file(self, project_name: str, analysis: str):
-        """Save Pulumi Copilot analysis to a markdown file"""
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{project_name}_analysis_{timestamp}.md"
+        now = datetime.datetime.now()
+        filename = f"{project_name}_analysis_{now.strftime('%Y%m%d_%H%M%S')}.md"
         filepath = self.analysis_dir / filename
-        
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(f"# Pulumi Copilot Analysis for {project_name}\n\n")
-            f.write(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write("## Analysis\n\n")
-            f.write(analysis)
+
+        header = (
+            f"# Pulumi Copilot Analysis for {project_name}\n\n"
+            f"Generated on: {now.isoformat(sep=' ', timespec='seconds')}\n\n"
+            "## Analysis\n\n"
+        )
+
+        async with aiofiles.open(filepath, "w", encoding="utf-8") as f:
+            await f.write(header)
+            if isinstance(analysis, str):
+                await f.write(analysis)
+            else:
+                async for chunk in analysis:
+                    await f.write(chunk)
+
+    def schedule_analysis_save(self, project_name: str, analysis: Union[str, AsyncIterable[str]]) -> asyncio.Task:
+        """Write the analysis in the background so the reply doesn't wait on disk I/O"""
+        task = asyncio.create_task(self.save_analysis_to_file(project_name, analysis))
+        self.pending_saves.add(task)
+        task.add_done_callback(self._on_save_done)
+        return task
+
+    def _on_save_done(self, task: asyncio.Task):
+        """Drop finished save tasks and report any write failure"""
+        self.pending_saves.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"\nFailed to save analysis: {task.exception()}")
+
+    async def wait_for_pending_saves(self):
+        """Wait for any background analysis writes to finish"""
+        if self.pending_saves:
+            await asyncio.gather(*self.pending_saves, return_exceptions=True)
+
+    async def aclose(self):
+        """Finish background saves and release the orchestrator's connections"""
+        await self.wait_for_pending_saves()
+        if self._orchestrator is not None:
+            await self._orchestrator.aclose()
 
     async def process_message(self, user_message: str) -> str:
         """
         Main message processing pipeline:
         1. Tracks conversation history
-        2. Handles different command types:
+        2. Checks the message for command keywords and dispatches to a handler:
            - Project creation
            - Deployment
            - Destruction
@@ -58,171 +224,203 @@ class AIChatInterface:
 
         # Handle project name input if we're waiting for it
         if self.awaiting_project_name:
-            self.awaiting_project_name = False
-            project_name = user_message.strip().replace(" ", "-").lower()
+            response = await self._handle_project_name(user_message)
+        else:
+            for predicate, handler in self._dispatch:
+                if predicate(self, message_lower):
+                    response = await handler(self)
+                    break
+            else:
+                response = self._handle_default()
+
+        self.conversation_history.append(f"Assistant: {response}")
+        return response
+
+    async def _handle_project_name(self, user_message: str) -> str:
+        """Create the named project and run the Copilot analysis on it"""
+        self.awaiting_project_name = False
+        project_name = user_message.strip().replace(" ", "-").lower()
+        try:
+            creation_response = await self.orchestrator.create_new_project("static-website-azure-go", project_name)
+            self.current_project = project_name
+
+            # Analyze the code with Pulumi Copilot first
+            analysis_response = await self.orchestrator.copilot.communicate(f"Analyze {project_name}")
             try:
-                creation_response = await self.orchestrator.create_new_project("static-website-azure-go", project_name)
-                self.current_project = project_name
-                
-                # Analyze the code with Pulumi Copilot first
-                analysis_response = await self.orchestrator.copilot.communicate(f"Analyze {project_name}")
-                try:
-                    analysis_data = json.loads(analysis_response)
-                    if analysis_data.get("status") == "success":
-                        # Save analysis to file
-                        await self.save_analysis_to_file(
-                            project_name, 
-                            analysis_data.get("analysis", "No analysis provided")
-                        )
-                        
-                        self.awaiting_deployment_confirmation = True
-                        response = "\n".join([
-                            f"I've created a new static website project '{project_name}' using Pulumi's Azure Go template.",
-                            "\n🤖 Pulumi Copilot Analysis:",
-                            analysis_data.get("analysis", "No analysis provided"),
-                            "\nAnalysis has been saved to the 'analysis' directory.",
-                            "\nWould you like me to proceed with deployment? (yes/no)"
-                        ])
-                    else:
-                        response = "\n".join([
-                            f"I've created the project '{project_name}', but the code analysis failed:",
-                            analysis_data.get("message", "Unknown error"),
-                            "Would you like to proceed with deployment anyway? (yes/no)"
-                        ])
-                        self.awaiting_deployment_confirmation = True
-                except json.JSONDecodeError:
-                    response = f"Project created, but failed to parse the code analysis. Would you like to proceed with deployment? (yes/no)"
+                analysis_data: CopilotResponse = _loads(analysis_response)
+                if analysis_data.get("status") == "success":
+                    analysis_text = analysis_data.get("analysis", "No analysis provided")
+                    # Save analysis to file in the background while we reply
+                    self.schedule_analysis_save(project_name, analysis_text)
+
                     self.awaiting_deployment_confirmation = True
-            except Exception as e:
-                response = f"Sorry, I encountered an error while creating the project: {str(e)}"
-
-        # Handle deployment confirmation
-        elif self.awaiting_deployment_confirmation and any(word in message_lower for word in ["yes", "sure", "okay"]):
-            self.awaiting_deployment_confirmation = False
-            app_spec = ApplicationSpec(
-                name=self.current_project,
-                description="A static website with Azure CDN",
-                framework="go",
-                target_framework="go",
-                container_port=80
-            )
-            
-            try:
-                responses = await self.orchestrator.process_request(app_spec, "deploy")
-                try:
-                    deploy_data = json.loads(responses[-1])
-                    if deploy_data.get("status") == "success":
-                        response = "\n".join([
-                            "I've deployed your application. Here's what happened:",
-                            *[f"- {r}" for r in responses[:-1]],
-                            f"✨ {deploy_data.get('message', 'Deployment completed successfully')}"
-                        ])
-                    else:
-                        response = "\n".join([
-                            "Deployment attempt completed. Here's what happened:",
-                            *[f"- {r}" for r in responses]
-                        ])
-                except json.JSONDecodeError:
-                    response = "\n".join([
-                        "Deployment completed. Here's what happened:",
-                        *[f"- {r}" for r in responses]
-                    ])
-            except Exception as e:
-                response = f"Sorry, I encountered an error while deploying: {str(e)}"
-
-        # Handle deployment command
-        elif "deploy" in message_lower and self.current_project:
-            app_spec = ApplicationSpec(
-                name=self.current_project,
-                description="A static website with Azure CDN",
-                framework="go",
-                target_framework="go",
-                container_port=80
-            )
-            try:
-                responses = await self.orchestrator.process_request(app_spec, "deploy")
-                try:
-                    deploy_data = json.loads(responses[-1])
-                    if deploy_data.get("status") == "success":
-                        response = "\n".join([
-                            "I've deployed your application. Here's what happened:",
-                            *[f"- {r}" for r in responses[:-1]],
-                            f"✨ {deploy_data.get('message', 'Deployment completed successfully')}"
-                        ])
-                    else:
-                        response = "\n".join([
-                            "Deployment attempt completed. Here's what happened:",
-                            *[f"- {r}" for r in responses]
-                        ])
-                except json.JSONDecodeError:
-                    response = "\n".join([
-                        "Deployment completed. Here's what happened:",
-                        *[f"- {r}" for r in responses]
-                    ])
-            except Exception as e:
-                response = f"Sorry, I encountered an error while deploying: {str(e)}"
-
-        # Handle destroy request
-        elif "destroy" in message_lower or "remove" in message_lower or "delete" in message_lower:
-            if not self.current_project:
-                response = "There's no active project to destroy. Would you like to create a new static website project?"
-            else:
-                app_spec = ApplicationSpec(
-                    name=self.current_project,
-                    description="A static website with Azure CDN",
-                    framework="go",
-                    target_framework="go",
-                    container_port=80
-                )
-                try:
-                    responses = await self.orchestrator.process_request(app_spec, "destroy")
-                    try:
-                        destroy_data = json.loads(responses[-1])
-                        if destroy_data.get("status") == "success":
-                            response = "\n".join([
-                                "I've destroyed your application. Here's what I did:",
-                                *[f"- {r}" for r in responses[:-1]],
-                                f"✨ {destroy_data.get('message', 'Application destroyed successfully')}"
-                            ])
-                            self.current_project = None
-                        else:
-                            response = "\n".join([
-                                "I've attempted to destroy your application. Here's what happened:",
-                                *[f"- {r}" for r in responses]
-                            ])
-                    except json.JSONDecodeError:
-                        response = "\n".join([
-                            "I've attempted to destroy your application. Here's what happened:",
-                            *[f"- {r}" for r in responses]
-                        ])
-                except Exception as e:
-                    response = f"Sorry, I encountered an error while destroying the application: {str(e)}"
-
-        # Handle create static website request
-        elif "create" in message_lower and "static website" in message_lower:
-            self.awaiting_project_name = True
-            response = "What would you like to name your project? (Please provide a simple name, it will be converted to lowercase with hyphens)"
-
-        # Handle initial greeting or unknown commands
+                    response = _PROJECT_CREATED.format_map({"project": project_name, "analysis": analysis_text})
+                else:
+                    response = _PROJECT_ANALYSIS_FAILED.format_map({
+                        "project": project_name,
+                        "message": analysis_data.get("message", "Unknown error")
+                    })
+                    self.awaiting_deployment_confirmation = True
+            except ValueError:
+                response = _PROJECT_ANALYSIS_UNPARSED
+                self.awaiting_deployment_confirmation = True
+        except _HANDLED_ERRORS as e:
+            response = _CREATE_FAILED.format_map({"error": e})
+        return response
+
+    def _current_spec(self) -> ApplicationSpec:
+        """Build the application spec for the active project"""
+        return ApplicationSpec(
+            name=self.current_project,
+            description=self._DESCRIPTION,
+            framework="go",
+            target_framework="go",
+            container_port=80
+        )
+
+    async def _run_action(self, action: str) -> Tuple[str, bool]:
+        """
+        Run an orchestrator action on the active project and summarise it for the user.
+        Steps are formatted as they stream in; the last one is the agent's JSON status.
+        Returns the reply text and whether the action succeeded.
+        """
+        text = self._RESPONSE_TEXT[action]
+        lines = [""]  # Header slot, filled in once the outcome is known
+        final = None
+        async for step in self.orchestrator.process_request(self._current_spec(), action):
+            if final is not None:
+                lines.append(f"- {final}")
+            final = step
+
+        try:
+            result: DeploymentResponse = _loads(final)
+        except ValueError:
+            succeeded = False
+            lines[0] = text["unparsed"]
+            lines.append(f"- {final}")
         else:
-            if self.current_project:
-                response = (
-                    f"I can help you manage your project '{self.current_project}'. "
-                    "You can ask me to:\n"
-                    "• Deploy your application\n"
-                    "• Destroy your application\n"
-                    "Or create a new static website"
-                )
+            succeeded = result.get("status") == "success"
+            if succeeded:
+                lines[0] = text["success"]
+                lines.append(f"✨ {result.get('message', text['default'])}")
             else:
-                response = (
-                    "I can help you create and manage static websites on Azure. "
-                    "Would you like me to create a simple Go app for a static website? "
-                    "Just let me know!"
-                )
+                lines[0] = text["failure"]
+                lines.append(f"- {final}")
+        return "\n".join(lines), succeeded
 
-        self.conversation_history.append(f"Assistant: {response}")
+    async def _handle_deploy(self) -> str:
+        """Deploy the current project, either on confirmation or on request"""
+        self.awaiting_deployment_confirmation = False
+        try:
+            response, _ = await self._run_action("deploy")
+        except _HANDLED_ERRORS as e:
+            response = self._RESPONSE_TEXT["deploy"]["error"].format_map({"error": e})
         return response
 
+    async def _handle_destroy(self) -> str:
+        """Destroy the current project's infrastructure"""
+        if not self.current_project:
+            return _NO_PROJECT_TO_DESTROY
+
+        try:
+            response, destroyed = await self._run_action("destroy")
+            if destroyed:
+                self.current_project = None
+        except _HANDLED_ERRORS as e:
+            response = self._RESPONSE_TEXT["destroy"]["error"].format_map({"error": e})
+        return response
+
+    async def _handle_create(self) -> str:
+        """Ask for a project name before creating a static website"""
+        self.awaiting_project_name = True
+        return _ASK_PROJECT_NAME
+
+    def _handle_default(self) -> str:
+        """Handle initial greeting or unknown commands"""
+        if self.current_project:
+            return _GREETING_WITH_PROJECT.format_map({"project": self.current_project})
+        return _GREETING
+
+    # Checked in order; the first matching predicate picks the handler
+    _dispatch = (
+        (lambda self, message: self.awaiting_deployment_confirmation and _mentions(message, _CONFIRM_KEYWORDS), _handle_deploy),
+        (lambda self, message: _mentions(message, _DEPLOY_KEYWORDS) and self.current_project is not None, _handle_deploy),
+        (lambda self, message: _mentions(message, _DESTROY_KEYWORDS), _handle_destroy),
+        (lambda self, message: _mentions(message, _CREATE_KEYWORDS) and _mentions(message, _STATIC_WEBSITE_KEYWORDS), _handle_create),
+    )
+
+# Bytes read from stdin past the last complete line, kept for the next _read_input
+_stdin_pending = bytearray()
+
+def _pop_stdin_line() -> Union[str, None]:
+    end = _stdin_pending.find(b"\n")
+    if end < 0:
+        return None
+    line = bytes(_stdin_pending[:end])
+    del _stdin_pending[:end + 1]
+    return line.decode(errors="replace").rstrip("\r")
+
+async def _read_input(prompt: str) -> str:
+    """
+    Reads a line from stdin without blocking the event loop. Waits for stdin to be
+    readable with add_reader where the loop supports it, so no thread is left
+    blocked in input() to keep the process alive after Ctrl-C.
+    """
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = _pop_stdin_line()
+    if line is not None:
+        return line
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result: str, error: Union[BaseException, None]):
+        if future.done():
+            return  # The caller was cancelled while we waited
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def on_readable():
+        data = os.read(fd, 4096)
+        if not data:
+            # EOF: hand back a final unterminated line once, then EOFError
+            rest = _stdin_pending.decode(errors="replace")
+            _stdin_pending.clear()
+            resolve(rest, None if rest else EOFError())
+            return
+        _stdin_pending.extend(data)
+        line = _pop_stdin_line()
+        if line is not None:
+            resolve(line, None)
+
+    try:
+        fd = sys.stdin.fileno()
+        loop.add_reader(fd, on_readable)
+    except (AttributeError, OSError, ValueError, NotImplementedError):
+        pass  # e.g. the Windows proactor loop or a regular file; fall back to a daemon thread
+    else:
+        try:
+            return await future
+        finally:
+            loop.remove_reader(fd)
+
+    def read():
+        try:
+            result, error = input(), None
+        except BaseException as e:  # EOFError on closed stdin, surfaced to the caller
+            result, error = "", e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    # Not the default executor: its worker isn't a daemon and would block interpreter exit
+    threading.Thread(target=read, name="stdin-reader", daemon=True).start()
+    return await future
+
 async def main():
     """
     Main entry point for the chat interface:
@@ -233,24 +431,29 @@ async def main():
     """
     chat = AIChatInterface()
     
-    print("\n🤖 Welcome to the AI Platform Engineering Assistant!")
-    print("-----------------------------------------------------")
-    print("I can help you create and manage static websites on Azure.")
-    print("You can ask me to:")
-    print("  • Create a simple Go app for a static website")
-    print("  • Deploy your application")
-    print("  • Destroy your application")
-    print("\nWhat would you like to do? (type 'exit' to quit)")
-    print("-----------------------------------------------------")
+    sys.stdout.write(_WELCOME)
+    sys.stdout.flush()
     
-    while True:
-        user_input = input("\nYou: ")
-        if user_input.lower() == 'exit':
-            print("\nGoodbye! Have a great day! 👋")
-            break
-            
-        response = await chat.process_message(user_input)
-        print(f"\nAssistant: {response}")
+    try:
+        while True:
+            # Read stdin off the loop so background tasks keep running while we wait
+            user_input = await _read_input("\nYou: ")
+            if user_input.lower() == 'exit':
+                print("\nGoodbye! Have a great day! 👋")
+                break
+                
+            response = await chat.process_message(user_input)
+            await flush_logs()  # Let agent logs for this turn land before the reply
+            print(f"\nAssistant: {response}")
+    finally:
+        await chat.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    # Prefer uvloop's libuv-based event loop when it's installed
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
+ 
\ No newline at end of file
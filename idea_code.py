@@ -1,19 +1,36 @@
 import os
-from typing import Dict, List, Optional
+import sys
+from typing import AsyncIterator, Dict, List, Optional, TypedDict
 from dataclasses import dataclass
+from functools import lru_cache
 import asyncio
+import logging
+import logging.handlers
+import queue
 from abc import ABC, abstractmethod
-from github import Github
-import json
+from githubkit import GitHub
+import orjson
 from pathlib import Path
 import subprocess
+import shlex
+import hashlib
+import time
 from dotenv import load_dotenv
+from pulumi import automation as auto
 import aiohttp
+import aiofiles
 
 # Load environment variables from .env file
 load_dotenv()
 
-@dataclass
+def _dumps(obj) -> str:
+    """Serialises an agent response to a JSON string"""
+    return orjson.dumps(obj).decode()
+
+# Maximum number of generated templates kept per cache
+SPEC_CACHE_MAXSIZE = int(os.getenv("SPEC_CACHE_MAXSIZE", "128"))
+
+@dataclass(frozen=True)
 class ApplicationSpec:
     """Defines the specifications for an application to be deployed"""
     name: str
@@ -22,6 +39,123 @@ class ApplicationSpec:
     target_framework: str  # Not really needed for Go but keep for compatibility
     container_port: int = 80
 
+async def run_command(argv: List[str], cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+    """
+    Runs a command without blocking the event loop and captures its output.
+    Takes an argv list and execs it directly, so there's no /bin/sh in between.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *argv,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # Don't leave the child running after its caller has given up on it
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass  # Exited on its own in the meantime
+            await proc.wait()
+        raise
+    return subprocess.CompletedProcess(
+        argv,
+        proc.returncode,
+        stdout.decode(errors="replace"),
+        stderr.decode(errors="replace")
+    )
+
+# Agent log lines go through a bounded queue drained by a QueueListener thread,
+# so agents running concurrently never block on terminal I/O
+LOG_QUEUE_MAXSIZE = 1000
+# Status events buffered for a slow consumer; past this, the oldest are dropped rather than stall a deploy
+STATUS_QUEUE_MAXSIZE = 100
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drops a record when the queue is full rather than make agents wait on the terminal"""
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+# queue.Queue isn't tied to an event loop, so logging works from any loop or thread
+_log_q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_MAXSIZE)
+_logger = logging.getLogger("tidi")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+_logger.addHandler(_DroppingQueueHandler(_log_q))
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+def start_log_writer():
+    """Starts the thread that writes queued log lines; until then log() writes directly"""
+    global _log_listener
+    if _log_listener is None:
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        stdout_handler.setFormatter(logging.Formatter("%(message)s"))
+        _log_listener = logging.handlers.QueueListener(_log_q, stdout_handler)
+        _log_listener.start()
+
+async def stop_log_writer():
+    """Writes out any queued lines and stops the log writer"""
+    global _log_listener
+    if _log_listener is None:
+        return
+    listener, _log_listener = _log_listener, None
+    # Drain first so the stop sentinel always has room in the bounded queue
+    await asyncio.to_thread(_log_q.join)
+    await asyncio.to_thread(listener.stop)
+
+async def flush_logs():
+    """Waits until every queued log line has been written"""
+    if _log_listener is not None:
+        await asyncio.to_thread(_log_q.join)
+
+def log(message: str):
+    """Queues a log line for the writer thread. Safe to call from worker threads."""
+    if _log_listener is None:
+        sys.stdout.write(message + "\n")
+        return
+    _logger.info(message)
+
+def _print_output(line: str):
+    """Echoes a line of Pulumi engine output as it streams in"""
+    log(line.rstrip("\n"))
+
+# On-disk cache of Copilot analyses, keyed by a hash of the query (which embeds the code)
+ANALYSIS_CACHE_DIR = Path(os.getenv("TIDI_COPILOT_CACHE_DIR", str(Path.home() / ".tidi-copilot-cache")))
+ANALYSIS_CACHE_TTL = 24 * 60 * 60  # Seconds a cached analysis stays valid
+ANALYSIS_CACHE_MAX_ENTRIES = 256
+
+# Copilot HTTP client limits
+COPILOT_MAX_CONNECTIONS = 10
+COPILOT_DNS_CACHE_TTL = 300  # Seconds
+COPILOT_REQUEST_TIMEOUT = 60  # Seconds for a whole request
+COPILOT_CONNECT_TIMEOUT = 5  # Seconds to open a connection
+# Cheap authenticated endpoint for connection tests, and how long a passing test is reused
+PULUMI_USER_URL = "https://api.pulumi.com/api/user"
+CONNECTION_CHECK_TTL = 60  # Seconds
+
+# Upper bound on a Pulumi stack operation such as 'up', in seconds
+PULUMI_COMMAND_TIMEOUT = float(os.getenv("PULUMI_COMMAND_TIMEOUT", "1800"))
+# Lines of a failed command's stderr kept for error messages
+ERROR_TAIL_LINES = 50
+
+class CopilotResponse(TypedDict, total=False):
+    """JSON status returned by PulumiCopilotAgent"""
+    status: str  # "success" or "error"
+    analysis: str  # Present on success
+    message: str  # Present on error
+
+class DeploymentResponse(TypedDict, total=False):
+    """JSON status returned by DeploymentAgent"""
+    status: str  # "success" or "error"
+    message: str
+    outputs: Dict  # Pulumi stack outputs, present after a successful deploy
+
 class BaseAgent(ABC):
     """Abstract base class for all agents in the system"""
     def __init__(self, name: str):
@@ -35,19 +169,17 @@ class BaseAgent(ABC):
 
     async def communicate(self, message: str) -> str:
         """Handles communication logging and message processing"""
-        print(f"\n{self.name} processing: {message}")
+        log(f"\n{self.name} processing: {message}")
         response = await self.process(message)
-        print(f"{self.name} responds: {response}")
+        log(f"{self.name} responds: {response}")
         return response
 
-class CodeGeneratorAgent(BaseAgent):
-    def __init__(self):
-        super().__init__("CodeGenerator")
-    
-    async def process(self, message: str) -> str:
-        # For demo purposes, we'll return a simple template
-        # In a real implementation, this would integrate with an LLM
-        return """
+@lru_cache(maxsize=SPEC_CACHE_MAXSIZE)
+def _generate_app_code(message: str) -> str:
+    """Application code for a request, memoized so repeated requests skip generation"""
+    # For demo purposes, we'll return a simple template
+    # In a real implementation, this would integrate with an LLM
+    return """
         package main
 
         import (
@@ -64,11 +196,30 @@ class CodeGeneratorAgent(BaseAgent):
         }
         """
 
+class CodeGeneratorAgent(BaseAgent):
+    def __init__(self):
+        super().__init__("CodeGenerator")
+    
+    async def process(self, message: str) -> str:
+        return _generate_app_code(message)
+
 class InfrastructureAgent(BaseAgent):
     def __init__(self):
         super().__init__("Infrastructure")
+        self._cache: Dict[tuple, str] = {}  # Generated code keyed by the spec fields it depends on
     
     async def generate_pulumi_code(self, app_spec: ApplicationSpec) -> str:
+        """Returns Pulumi code for the spec, reusing earlier output on re-deploys and retries"""
+        key = (app_spec.name, app_spec.framework, app_spec.container_port)
+        if key in self._cache:
+            return self._cache[key]
+        code = await self._render_pulumi_code(app_spec)
+        if len(self._cache) >= SPEC_CACHE_MAXSIZE:
+            self._cache.pop(next(iter(self._cache)))  # Evict the oldest entry
+        self._cache[key] = code
+        return code
+
+    async def _render_pulumi_code(self, app_spec: ApplicationSpec) -> str:
         return """
         package main
 
@@ -129,64 +280,135 @@ class GitOpsAgent(BaseAgent):
         github_token = os.getenv('GITHUB_TOKEN')
         if not github_token:
             raise ValueError("GITHUB_TOKEN environment variable is not set")
-        self.github = Github(github_token)
+        self.github = GitHub(github_token)  # Async REST client, calls are awaited on the event loop
     
     async def process(self, message: str) -> str:
         return "Processing GitOps request"
+
+    async def _owner(self) -> str:
+        """Login of the authenticated user, fetched once and kept in context"""
+        if "owner" not in self.context:
+            response = await self.github.rest.users.async_get_authenticated()
+            self.context["owner"] = response.parsed_data.login
+        return self.context["owner"]
+    
+    async def _register_webhook(self, repo_name: str):
+        """
+        Points the repository's webhook at the receiver in webhook.py, when one is
+        configured, so CI and push events arrive as they happen instead of being polled for
+        """
+        webhook_url = os.getenv('GITHUB_WEBHOOK_URL')
+        if not webhook_url:
+            return
+        webhook_secret = os.getenv('GITHUB_WEBHOOK_SECRET')
+        if not webhook_secret:
+            # webhook.py rejects unsigned deliveries, so a hook without a secret could never deliver
+            log("Warning: GITHUB_WEBHOOK_URL is set but GITHUB_WEBHOOK_SECRET isn't; skipping webhook registration")
+            return
+        try:
+            await self.github.rest.repos.async_create_webhook(
+                await self._owner(),
+                repo_name,
+                config={
+                    "url": webhook_url,
+                    "content_type": "json",
+                    "secret": webhook_secret
+                },
+                events=["push", "workflow_run", "deployment_status"]
+            )
+        except Exception as e:
+            # The repository itself exists either way; a missing hook only costs us live events
+            log(f"Warning: failed to register webhook on {repo_name}: {str(e)}")
     
     async def create_repository(self, app_spec: ApplicationSpec) -> str:
         try:
             # Create GitHub repository
-            user = self.github.get_user()
-            repo = user.create_repo(
-                app_spec.name,
+            response = await self.github.rest.repos.async_create_for_authenticated_user(
+                name=app_spec.name,
                 description=app_spec.description,
                 private=True
             )
+            repo = response.parsed_data
+            await self._register_webhook(repo.name)
             return f"Created repository: {repo.html_url}"
         except Exception as e:
             return f"Failed to create repository: {str(e)}"
 
+    async def _git(self, *args: str, cwd: str) -> subprocess.CompletedProcess:
+        """Runs one git command, raising if it fails"""
+        argv = ["git", *args]
+        cmd = shlex.join(argv)
+        result = await run_command(argv, cwd=cwd)
+        if result.returncode != 0:
+            raise RuntimeError(f"Command failed: {cmd}\nError: {result.stderr}")
+        log(f"Executed: {cmd}")
+        log(f"Output: {result.stdout}")
+        return result
+
     async def commit_code(self, app_spec: ApplicationSpec, app_code: str, pulumi_code: str) -> str:
         try:
-            repo = self.github.get_user().get_repo(app_spec.name)
-            base_path = Path("talkitdoit-demo-app")  # Use existing directory
-            
-            # Initialize git in the existing directory
-            git_commands = [
-                "git init",
-                "git add .",
-                'git commit -m "Initial commit"',
-                f"git remote add origin {repo.clone_url}",
-                "git branch -M main",
-                "git push -u origin main"
-            ]
+            base_path = "talkitdoit-demo-app"  # Use existing directory
             
-            for cmd in git_commands:
-                result = subprocess.run(
-                    cmd,
-                    shell=True,
-                    check=True,
-                    cwd=str(base_path),
-                    capture_output=True,
-                    text=True
-                )
-                print(f"Executed: {cmd}")
-                print(f"Output: {result.stdout}")
+            async def fetch_repo():
+                response = await self.github.rest.repos.async_get(await self._owner(), app_spec.name)
+                return response.parsed_data
+
+            # Staging only takes the index lock, so it overlaps the remote and branch setup.
+            # Those two both rewrite .git/config under config.lock and must run one at a time.
+            async def configure_remote_and_branch():
+                await self._git("remote", "add", "origin", repo.clone_url, cwd=base_path)
+                await self._git("branch", "-M", "main", cwd=base_path)
+
+            # Task groups cancel the sibling steps as soon as one of them fails
+            async with asyncio.TaskGroup() as tg:
+                # Initialize git in the existing directory while the repo details
+                # (including the owner lookup) are fetched
+                repo_task = tg.create_task(fetch_repo())
+                tg.create_task(self._git("init", cwd=base_path))
+            repo = repo_task.result()
+
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._git("add", ".", cwd=base_path))
+                tg.create_task(configure_remote_and_branch())
+            await self._git("commit", "-m", "Initial commit", cwd=base_path)
+            await self._git("push", "-u", "origin", "main", cwd=base_path)
             
             return f"Code committed to repository: {repo.html_url}"
         except Exception as e:
+            if isinstance(e, ExceptionGroup):
+                e = e.exceptions[0]  # Report the step that failed, not the task group
             return f"Failed to commit code: {str(e)}"
 
+def _command_error_tail(error: auto.errors.CommandError) -> str:
+    """
+    Last ERROR_TAIL_LINES lines of a failed CLI command's stderr. str() of a
+    CommandError is the command's code, entire stdout and stderr.
+    """
+    _, _, stderr = str(error).partition("\n stderr: ")
+    return "\n".join(stderr.strip().splitlines()[-ERROR_TAIL_LINES:])
+
+def _put_status(status_q: Optional["asyncio.Queue[Dict]"], event: Dict):
+    """
+    Publishes a status event without waiting. When nobody is draining the queue
+    it drops the oldest event, so a late subscriber still sees the current deploy.
+    """
+    if status_q is None:
+        return
+    if status_q.full():
+        status_q.get_nowait()
+    status_q.put_nowait(event)
+
 class DeploymentAgent(BaseAgent):
     """Handles deployment operations using Pulumi"""
-    def __init__(self):
+    def __init__(self, status_q: Optional["asyncio.Queue[Dict]"] = None):
         super().__init__("Deployment")
+        self.status_q = status_q
         # Load required credentials from environment
         self.azure_credentials = os.getenv('AZURE_CREDENTIALS')
         self.pulumi_token = os.getenv('PULUMI_ACCESS_TOKEN')
         if not self.azure_credentials or not self.pulumi_token:
             raise ValueError("AZURE_CREDENTIALS or PULUMI_ACCESS_TOKEN not set")
+        self._export_credentials()
     
     async def process(self, message: str) -> str:
         # Add message parsing to determine the action
@@ -200,25 +422,100 @@ class DeploymentAgent(BaseAgent):
             self.context["project_name"] = project_name
             return await self.deploy()
     
+    def _export_credentials(self):
+        """Parses the Azure credentials once and exports them, with the Pulumi token, for the Pulumi CLI"""
+        try:
+            azure_creds = orjson.loads(self.azure_credentials)
+            os.environ['ARM_CLIENT_ID'] = azure_creds['clientId']
+            os.environ['ARM_CLIENT_SECRET'] = azure_creds['clientSecret']
+            os.environ['ARM_TENANT_ID'] = azure_creds['tenantId']
+            os.environ['ARM_SUBSCRIPTION_ID'] = azure_creds['subscriptionId']
+        except (ValueError, KeyError) as e:
+            raise ValueError(f"AZURE_CREDENTIALS is not valid credentials JSON: {e}") from e
+        
+        # Set up Pulumi access
+        os.environ['PULUMI_ACCESS_TOKEN'] = self.pulumi_token
+
+    async def _run_step(self, argv: List[str], cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        """Runs one Pulumi/Go command, raising if it fails"""
+        cmd = shlex.join(argv)
+        _put_status(self.status_q, {"step": cmd, "status": "started"})
+        result = await run_command(argv, cwd=cwd)
+        log(f"Executing: {cmd}")
+        log(f"Output: {result.stdout}")
+        if result.returncode != 0:
+            _put_status(self.status_q, {"step": cmd, "status": "failed"})
+            raise RuntimeError(f"Command failed: {cmd}\nError: {result.stderr}")
+        _put_status(self.status_q, {"step": cmd, "status": "complete"})
+        return result
+
+    async def pulumi_login(self):
+        """
+        Logs in to Pulumi once per agent. Doesn't depend on any project,
+        so the orchestrator can start it alongside other setup work.
+        """
+        if self.context.get("logged_in"):
+            return
+        await self._run_step(["pulumi", "login"])
+        self.context["logged_in"] = True
+
+    async def _stack(self, project_name: str, project_path: str, create: bool = True) -> auto.Stack:
+        """
+        Automation API handle for the project's dev stack. Selecting a stack is
+        a CLI round-trip, so the handle is created once and kept in context.
+        With create=False a missing stack is an error instead of being created.
+        """
+        stacks = self.context.setdefault("stacks", {})
+        if project_name not in stacks:
+            stack_name = f"talkitdoit-org/{project_name}/dev"
+            try:
+                stacks[project_name] = await asyncio.to_thread(
+                    auto.create_or_select_stack if create else auto.select_stack,
+                    stack_name=stack_name,
+                    work_dir=project_path
+                )
+            except auto.errors.StackNotFoundError as e:
+                raise ValueError(f"Stack {stack_name} does not exist") from e
+            except auto.errors.CommandError as e:
+                raise RuntimeError(f"Selecting stack {stack_name} failed: {_command_error_tail(e)}") from e
+        return stacks[project_name]
+
+    async def _run_stack_operation(self, stack: auto.Stack, operation: str):
+        """
+        Runs a blocking stack operation ("up" or "destroy") on a worker thread,
+        streaming its output. Cancels the update if it exceeds PULUMI_COMMAND_TIMEOUT.
+        """
+        run = getattr(stack, operation)
+        step = f"pulumi {operation}"
+        _put_status(self.status_q, {"step": step, "status": "started"})
+        try:
+            result = await asyncio.wait_for(
+                asyncio.to_thread(run, on_output=_print_output),
+                PULUMI_COMMAND_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            _put_status(self.status_q, {"step": step, "status": "failed"})
+            await asyncio.to_thread(stack.cancel)
+            raise RuntimeError(f"{step} timed out after {PULUMI_COMMAND_TIMEOUT}s")
+        except auto.errors.CommandError as e:
+            # The full output already streamed to the log; report only the end of stderr
+            _put_status(self.status_q, {"step": step, "status": "failed"})
+            raise RuntimeError(f"{step} failed: {_command_error_tail(e)}") from e
+        except Exception:
+            _put_status(self.status_q, {"step": step, "status": "failed"})
+            raise
+        _put_status(self.status_q, {"step": step, "status": "complete"})
+        return result
+
     async def deploy(self) -> str:
         """
         Deploys the application using Pulumi:
-        1. Sets up Azure credentials
-        2. Configures Pulumi access
-        3. Runs deployment commands
+        1. Logs in to Pulumi while Go modules resolve
+        2. Selects the project's stack and sets its config through the Automation API
+        3. Runs the update, streaming its output
         4. Returns deployment status and outputs
         """
         try:
-            # Set up Azure credentials
-            azure_creds = json.loads(self.azure_credentials)
-            os.environ['ARM_CLIENT_ID'] = azure_creds['clientId']
-            os.environ['ARM_CLIENT_SECRET'] = azure_creds['clientSecret']
-            os.environ['ARM_TENANT_ID'] = azure_creds['tenantId']
-            os.environ['ARM_SUBSCRIPTION_ID'] = azure_creds['subscriptionId']
-            
-            # Set up Pulumi access
-            os.environ['PULUMI_ACCESS_TOKEN'] = self.pulumi_token
-            
             # Use the project name from context
             project_name = self.context.get("project_name")
             if not project_name:
@@ -227,53 +524,30 @@ class DeploymentAgent(BaseAgent):
             project_path = Path(project_name)
             if not project_path.exists():
                 raise ValueError(f"Project directory {project_name} does not exist")
+            project_dir = str(project_path)
             
-            commands = [
-                "pulumi login",
-                "go mod tidy",
-                f"pulumi stack select talkitdoit-org/{project_name}/dev",
-                "pulumi config set azure-native:location eastus",
-                "pulumi up --yes"
-            ]
-            
-            for cmd in commands:
-                result = subprocess.run(
-                    cmd,
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    cwd=str(project_path)
-                )
-                print(f"Executing: {cmd}")
-                print(f"Output: {result.stdout}")
-                if result.returncode != 0:
-                    raise Exception(f"Command failed: {cmd}\nError: {result.stderr}")
-            
-            # After successful deployment, get the output URLs
-            output_cmd = "pulumi stack output --json"
-            output_result = subprocess.run(
-                output_cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=str(project_path)
+            # Login and module resolution are independent of each other
+            await asyncio.gather(
+                self.pulumi_login(),
+                self._run_step(["go", "mod", "tidy"], cwd=project_dir)
             )
+            stack = await self._stack(project_name, project_dir)
+            await asyncio.to_thread(stack.set_config, "azure-native:location", auto.ConfigValue(value="eastus"))
+            up_result = await self._run_stack_operation(stack, "up")
             
-            if output_result.returncode == 0:
-                outputs = json.loads(output_result.stdout)
-                return json.dumps({
-                    "status": "success",
-                    "message": "Deployment completed successfully",
-                    "outputs": outputs
-                })
-            
-            return json.dumps({
+            # Mask secrets the same way 'pulumi stack output' does
+            outputs = {
+                key: "[secret]" if output.secret else output.value
+                for key, output in up_result.outputs.items()
+            }
+            return _dumps({
                 "status": "success",
-                "message": "Deployment completed successfully, but couldn't fetch URLs"
+                "message": "Deployment completed successfully",
+                "outputs": outputs
             })
             
         except Exception as e:
-            return json.dumps({
+            return _dumps({
                 "status": "error",
                 "message": f"Deployment failed: {str(e)}"
             })
@@ -281,54 +555,33 @@ class DeploymentAgent(BaseAgent):
     async def destroy(self, project_name: str) -> str:
         """
         Destroys deployed infrastructure:
-        1. Sets up credentials
-        2. Runs Pulumi destroy commands
+        1. Logs in to Pulumi
+        2. Destroys the project's stack through the Automation API
         3. Returns destruction status
         """
         try:
-            # Set up Azure credentials
-            azure_creds = json.loads(self.azure_credentials)
-            os.environ['ARM_CLIENT_ID'] = azure_creds['clientId']
-            os.environ['ARM_CLIENT_SECRET'] = azure_creds['clientSecret']
-            os.environ['ARM_TENANT_ID'] = azure_creds['tenantId']
-            os.environ['ARM_SUBSCRIPTION_ID'] = azure_creds['subscriptionId']
+            await self.pulumi_login()
+            # Only select here: creating a missing stack would "destroy" nothing and report success
+            stack = await self._stack(project_name, str(Path(project_name)), create=False)
+            await self._run_stack_operation(stack, "destroy")
             
-            # Set up Pulumi access
-            os.environ['PULUMI_ACCESS_TOKEN'] = self.pulumi_token
-            
-            project_path = Path(project_name)
-            
-            # Run the destroy command
-            commands = [
-                "pulumi login",
-                f"pulumi stack select talkitdoit-org/{project_name}/dev",
-                "pulumi destroy --yes"  # --yes flag to automatically approve
-            ]
-            
-            for cmd in commands:
-                result = subprocess.run(
-                    cmd,
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    cwd=str(project_path)
-                )
-                print(f"Executing: {cmd}")
-                print(f"Output: {result.stdout}")
-                if result.returncode != 0:
-                    raise Exception(f"Command failed: {cmd}\nError: {result.stderr}")
-            
-            return json.dumps({
+            return _dumps({
                 "status": "success",
                 "message": "Application successfully destroyed"
             })
             
         except Exception as e:
-            return json.dumps({
+            return _dumps({
                 "status": "error",
                 "message": f"Destroy failed: {str(e)}"
             })
 
+def _prune_analysis_cache():
+    """Deletes the oldest cached analyses beyond ANALYSIS_CACHE_MAX_ENTRIES"""
+    entries = sorted(ANALYSIS_CACHE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    for stale in entries[:-ANALYSIS_CACHE_MAX_ENTRIES]:
+        stale.unlink(missing_ok=True)
+
 class PulumiCopilotAgent(BaseAgent):
     def __init__(self):
         super().__init__("PulumiCopilot")
@@ -340,8 +593,82 @@ class PulumiCopilotAgent(BaseAgent):
             "Authorization": f"token {self.pulumi_token}",
             "Content-Type": "application/json"
         }
+        self._session: Optional[aiohttp.ClientSession] = None  # Shared across calls, see _get_session
+        # Last successful connection test, reused for CONNECTION_CHECK_TTL
+        self._last_ok_ts = 0.0
+        self._last_ok: Optional[str] = None
+        self._user_etag: Optional[str] = None
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared HTTP session, opening it on first use so connections are reused"""
+        if self._session is None or self._session.closed:
+            # Cap concurrent sockets and bound every request so a stalled connection can't hang a call
+            connector = aiohttp.TCPConnector(
+                limit=COPILOT_MAX_CONNECTIONS,
+                limit_per_host=COPILOT_MAX_CONNECTIONS,
+                ttl_dns_cache=COPILOT_DNS_CACHE_TTL
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=COPILOT_REQUEST_TIMEOUT, connect=COPILOT_CONNECT_TIMEOUT),
+                headers=self.headers,
+                json_serialize=_dumps
+            )
+        return self._session
+
+    async def close(self):
+        """Closes the shared HTTP session and its pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def test_connection(self) -> str:
+        """
+        Checks the token against the lightweight user endpoint, with a conditional
+        GET, instead of sending a query through Copilot. Only falls back to the
+        chat endpoint if the user endpoint gives an unexpected answer.
+        """
+        if self._last_ok is not None and time.monotonic() - self._last_ok_ts < CONNECTION_CHECK_TTL:
+            return self._last_ok
+        try:
+            headers = {"If-None-Match": self._user_etag} if self._user_etag else None
+            async with self._get_session().get(PULUMI_USER_URL, headers=headers) as response:
+                log(f"Status: {response.status}")
+                if response.status in (401, 403):
+                    return _dumps({
+                        "status": "error",
+                        "message": f"Status: {response.status}, Pulumi rejected the access token"
+                    })
+                if response.status in (200, 304):
+                    if response.status == 200:
+                        self._user_etag = response.headers.get("ETag")
+                    return self._remember_ok(_dumps({
+                        "status": "success",
+                        "message": f"Status: {response.status}, Authenticated with Pulumi Cloud"
+                    }))
+            return await self._test_chat_connection()
+
+        except Exception as e:
+            return _dumps({
+                "status": "error",
+                "message": f"Connection test failed: {str(e)}"
+            })
+
+    def _remember_ok(self, result: str) -> str:
+        """Keeps a passing test result so repeated checks skip the network"""
+        self._last_ok_ts = time.monotonic()
+        self._last_ok = result
+        return result
+
+    async def _test_chat_connection(self) -> str:
+        """Original connection test: sends a small query through the Copilot chat endpoint"""
         try:
             payload = {
                 "query": "Can you help me check my code?",
@@ -355,42 +682,73 @@ class PulumiCopilotAgent(BaseAgent):
                 }
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers=self.headers,
-                    json=payload
-                ) as response:
-                    print(f"Status: {response.status}")
-                    response_text = await response.text()
-                    print(f"Response: {response_text}")
-                    return json.dumps({
-                        "status": "success" if response.status == 200 else "error",
-                        "message": f"Status: {response.status}, Response: {response_text[:200]}"
-                    })
+            async with self._get_session().post(self.base_url, json=payload) as response:
+                log(f"Status: {response.status}")
+                response_text = await response.text()
+                log(f"Response: {response_text}")
+                result = _dumps({
+                    "status": "success" if response.status == 200 else "error",
+                    "message": f"Status: {response.status}, Response: {response_text[:200]}"
+                })
+                return self._remember_ok(result) if response.status == 200 else result
 
         except Exception as e:
-            return json.dumps({
+            return _dumps({
                 "status": "error",
                 "message": f"Connection test failed: {str(e)}"
             })
 
+    def _analysis_cache_path(self, query: str) -> Path:
+        """Cache file for a query; the hash only addresses content, it isn't used for security"""
+        return ANALYSIS_CACHE_DIR / f"{hashlib.sha256(query.encode('utf-8')).hexdigest()}.json"
+
+    async def _read_cached_analysis(self, path: Path) -> Optional[str]:
+        """Returns a cached analysis response, or None if it's missing or older than the TTL"""
+        try:
+            if time.time() - path.stat().st_mtime > ANALYSIS_CACHE_TTL:
+                return None
+            async with aiofiles.open(path, 'r', encoding='utf-8') as f:
+                return await f.read()
+        except OSError:
+            return None
+
+    async def _write_cached_analysis(self, path: Path, analysis: str):
+        """Stores an analysis response atomically and trims the cache to its size limit"""
+        try:
+            ANALYSIS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as f:
+                await f.write(analysis)
+            os.replace(tmp_path, path)
+            await asyncio.to_thread(_prune_analysis_cache)
+        except OSError as e:
+            # A cache failure shouldn't fail the analysis itself
+            log(f"Failed to cache analysis: {e}")
+
     async def analyze_code(self, project_path: str) -> str:
         try:
             # Read the main.go file content
             main_go_path = Path(project_path) / "main.go"
             if not main_go_path.exists():
-                return json.dumps({
+                return _dumps({
                     "status": "error",
                     "message": f"main.go not found in {project_path}"
                 })
 
-            with open(main_go_path, 'r') as f:
-                code_content = f.read()
+            async with aiofiles.open(main_go_path, 'r') as f:
+                code_content = await f.read()
+
+            query = f"Please analyze this Pulumi Go code for best practices and potential issues:\n\n```go\n{code_content}\n```"
+
+            # Unchanged code (e.g. retrying a deploy) reuses the earlier analysis
+            cache_path = self._analysis_cache_path(query)
+            cached = await self._read_cached_analysis(cache_path)
+            if cached is not None:
+                return cached
 
             # Use the documented API format
             payload = {
-                "query": f"Please analyze this Pulumi Go code for best practices and potential issues:\n\n```go\n{code_content}\n```",
+                "query": query,
                 "state": {
                     "client": {
                         "cloudContext": {
@@ -401,35 +759,32 @@ class PulumiCopilotAgent(BaseAgent):
                 }
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers=self.headers,
-                    json=payload
-                ) as response:
-                    response_text = await response.text()
-                    try:
-                        result = json.loads(response_text)
-                        # Extract the analysis from the response
-                        for message in result.get("messages", []):
-                            if message.get("role") == "assistant" and message.get("kind") == "response":
-                                return json.dumps({
-                                    "status": "success",
-                                    "analysis": message.get("content", "No analysis provided")
-                                })
-                        
-                        return json.dumps({
-                            "status": "error",
-                            "message": "No analysis found in response"
-                        })
-                    except json.JSONDecodeError:
-                        return json.dumps({
-                            "status": "error",
-                            "message": f"Failed to parse response: {response_text[:200]}..."
-                        })
+            async with self._get_session().post(self.base_url, json=payload) as response:
+                response_text = await response.text()
+                try:
+                    result = orjson.loads(response_text)
+                    # Extract the analysis from the response
+                    for message in result.get("messages", []):
+                        if message.get("role") == "assistant" and message.get("kind") == "response":
+                            analysis = _dumps({
+                                "status": "success",
+                                "analysis": message.get("content", "No analysis provided")
+                            })
+                            await self._write_cached_analysis(cache_path, analysis)
+                            return analysis
+                    
+                    return _dumps({
+                        "status": "error",
+                        "message": "No analysis found in response"
+                    })
+                except orjson.JSONDecodeError:
+                    return _dumps({
+                        "status": "error",
+                        "message": f"Failed to parse response: {response_text[:200]}..."
+                    })
 
         except Exception as e:
-            return json.dumps({
+            return _dumps({
                 "status": "error",
                 "message": f"Failed to analyze code: {str(e)}"
             })
@@ -442,43 +797,9 @@ class PulumiCopilotAgent(BaseAgent):
             return await self.analyze_code(project_name)
         return "Unknown command"
 
-class PlatformOrchestrator:
-    def __init__(self):
-        self.code_generator = CodeGeneratorAgent()
-        self.infrastructure = InfrastructureAgent()
-        self.gitops = GitOpsAgent()
-        self.deployment = DeploymentAgent()
-        self.copilot = PulumiCopilotAgent()
-    
-    async def create_new_project(self, template: str, project_name: str) -> str:
-        try:
-            # Create directory and initialize project
-            os.makedirs(project_name, exist_ok=True)
-            
-            # First create the Pulumi project
-            commands = [
-                f"pulumi new {template} -s talkitdoit-org/{project_name}/dev --yes --force"
-            ]
-            
-            for cmd in commands:
-                result = subprocess.run(
-                    cmd,
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    cwd=project_name
-                )
-                print(f"Executing: {cmd}")
-                print(f"Output: {result.stdout}")
-                if result.returncode != 0:
-                    raise Exception(f"Command failed: {cmd}\nError: {result.stderr}")
-
-            # Create www directory if it doesn't exist
-            www_dir = Path(project_name) / "www"
-            www_dir.mkdir(exist_ok=True)
-
-            # Create custom index.html with dark mode
-            custom_html = '''<!DOCTYPE html>
+# Dark mode landing page written into each new project's www directory,
+# encoded once since it's written as-is
+_CUSTOM_INDEX_HTML = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="utf-8">
@@ -531,29 +852,92 @@ class PlatformOrchestrator:
     </div>
 </body>
 </html>'''
+_CUSTOM_INDEX_HTML_BYTES = _CUSTOM_INDEX_HTML.encode('utf-8')
+
+class PlatformOrchestrator:
+    def __init__(self):
+        # Step progress from the agents, for whoever is driving the orchestrator
+        self.status_q: "asyncio.Queue[Dict]" = asyncio.Queue(maxsize=STATUS_QUEUE_MAXSIZE)
+        self.code_generator = CodeGeneratorAgent()
+        self.infrastructure = InfrastructureAgent()
+        self.gitops = GitOpsAgent()
+        self.deployment = DeploymentAgent(self.status_q)
+        self.copilot = PulumiCopilotAgent()
+        start_log_writer()
+
+    async def __aenter__(self):
+        await self.copilot.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Releases the connections held by the agents and writes out pending logs"""
+        await self.copilot.close()
+        await stop_log_writer()
+
+    def publish_status(self, event: Dict):
+        """Adds an outside event (e.g. a "ci_passed" from the webhook receiver) to the status stream"""
+        _put_status(self.status_q, event)
+
+    async def status_stream(self) -> AsyncIterator[Dict]:
+        """
+        Yields status events as they happen, e.g. {"step": "pulumi up", "status": "started"},
+        so a client can show progress while a long deploy is still running.
+        """
+        while True:
+            yield await self.status_q.get()
+    
+    async def create_new_project(self, template: str, project_name: str) -> str:
+        try:
+            # Create directory and initialize project
+            project_path = Path(project_name)
+            project_path.mkdir(parents=True, exist_ok=True)
+            
+            # First create the Pulumi project
+            commands = [
+                ["pulumi", "new", template, "-s", f"talkitdoit-org/{project_name}/dev", "--yes", "--force"]
+            ]
+            
+            for argv in commands:
+                cmd = shlex.join(argv)
+                result = await run_command(argv, cwd=project_name)
+                log(f"Executing: {cmd}")
+                log(f"Output: {result.stdout}")
+                if result.returncode != 0:
+                    raise RuntimeError(f"Command failed: {cmd}\nError: {result.stderr}")
 
-            # Write the custom index.html
+            # Create www directory if it doesn't exist
+            www_dir = project_path / "www"
+            www_dir.mkdir(exist_ok=True)
+
+            # Write the custom index.html with dark mode
             index_path = www_dir / "index.html"
-            with open(index_path, 'w', encoding='utf-8') as f:
-                f.write(custom_html)
+            async with aiofiles.open(index_path, 'wb') as f:
+                await f.write(_CUSTOM_INDEX_HTML_BYTES)
             
             return "Project created successfully with custom dark mode template"
         except Exception as e:
-            raise Exception(f"Failed to create project: {str(e)}")
+            raise RuntimeError(f"Failed to create project: {e}") from e
 
-    async def process_request(self, app_spec: ApplicationSpec, action: str = "deploy") -> List[str]:
-        responses = []
-        
+    async def process_request(self, app_spec: ApplicationSpec, action: str = "deploy") -> AsyncIterator[str]:
+        """
+        Runs the requested action, yielding each step's result as soon as it completes
+        so callers can report progress. The last item is the deployment agent's JSON status.
+        """
         if action == "destroy":
-            destroy_response = await self.deployment.communicate(f"Destroy {app_spec.name}")
-            responses.append(destroy_response)
+            yield await self.deployment.communicate(f"Destroy {app_spec.name}")
         else:
-            responses.append("Using newly created Pulumi project")
+            yield "Using newly created Pulumi project"
             
-            # Continue with deployment
-            await self.gitops.create_repository(app_spec)
+            # Continue with deployment. Repository creation and Pulumi login are
+            # independent network calls, so overlap them; a failed login is
+            # retried and reported by the deploy step itself.
+            await asyncio.gather(
+                self.gitops.create_repository(app_spec),
+                self.deployment.pulumi_login(),
+                return_exceptions=True
+            )
             await self.gitops.commit_code(app_spec, "", "")
-            deploy_response = await self.deployment.communicate(f"Deploy {app_spec.name}")
-            responses.append(deploy_response)
-        
-        return responses 
\ No newline at end of file
+            yield await self.deployment.communicate(f"Deploy {app_spec.name}")
@@ -1,4 +1,4 @@
-import requests
+import niquests
 import json
 
 class PulumiCopilotClient:
@@ -11,6 +11,9 @@ class PulumiCopilotClient:
             "Content-Type": "application/json"
         }
         self.org_id = org_id
+        # One HTTP/2 connection, with concurrent requests multiplexed over it
+        self.session = niquests.Session(multiplexed=True)
+        self.session.headers.update(self.headers)
 
     def start_conversation(self, query, url):
         """
@@ -35,7 +38,7 @@ class PulumiCopilotClient:
             }
         }
         
-        response = requests.post(endpoint, headers=self.headers, json=payload)
+        response = self.session.post(endpoint, json=payload)
         response.raise_for_status()
         return response.json()
 
@@ -64,10 +67,44 @@ class PulumiCopilotClient:
             "conversationId": conversation_id
         }
         
-        response = requests.post(endpoint, headers=self.headers, json=payload)
+        response = self.session.post(endpoint, json=payload)
         response.raise_for_status()
         return response.json()
 
+    def start_conversations(self, queries, url):
+        """
+        Starts one conversation per query, sending them all at once
+        Args:
+            queries: Questions or prompts, e.g. one analysis per project
+            url: Pulumi stack URL for context
+        Returns:
+            JSON responses from Copilot API, in the same order as queries
+        """
+        endpoint = f"{self.base_url}/api/ai/chat/preview"
+        
+        responses = [
+            self.session.post(endpoint, json={
+                "query": query,
+                "state": {
+                    "client": {
+                        "cloudContext": {
+                            "orgId": self.org_id,
+                            "url": url
+                        }
+                    }
+                }
+            })
+            for query in queries
+        ]
+        # Wait for every multiplexed response before reading any of them
+        self.session.gather(*responses)
+        
+        results = []
+        for response in responses:
+            response.raise_for_status()
+            results.append(response.json())
+        return results
+
 # Example usage:
 def main():
     # Replace these with your actual values
@@ -103,7 +140,7 @@ def main():
             if message["role"] == "assistant" and message["kind"] == "response":
                 print("Assistant:", message["content"])
                 
-    except requests.exceptions.RequestException as e:
+    except niquests.exceptions.RequestException as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
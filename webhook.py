@@ -0,0 +1,104 @@
+"""
+GitHub webhook receiver for repository and CI events.
+
+Run alongside the chat interface with:
+    uvicorn webhook:app --port 8000
+
+Deliveries with a valid X-Hub-Signature-256 are appended to a JSONL events file,
+which the platform can wait on with wait_for_event instead of polling GitHub.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import aiofiles
+from dotenv import load_dotenv
+from fastapi import FastAPI, Header, HTTPException, Request
+
+# Load environment variables from .env file
+load_dotenv()
+
+EVENTS_PATH = Path(os.getenv("TIDI_EVENTS_FILE", str(Path.home() / ".tidi-events.jsonl")))
+WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
+
+app = FastAPI()
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    """Checks GitHub's HMAC-SHA256 signature of the raw request body"""
+    if not secret or not signature:
+        return False
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+def append_event(event: Dict, path: Path = EVENTS_PATH):
+    """
+    Appends one event as a JSON line. The line goes out in a single O_APPEND
+    write, so concurrent writers never interleave and readers never see half an event.
+    """
+    line = (json.dumps(event) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+async def wait_for_event(
+    predicate: Callable[[Dict], bool],
+    path: Path = EVENTS_PATH,
+    timeout: Optional[float] = None,
+    poll_interval: float = 0.5
+) -> Dict:
+    """
+    Waits for the next event matching predicate, following the events file
+    from its current end. Raises asyncio.TimeoutError if timeout elapses first.
+    """
+    async def follow() -> Dict:
+        offset = path.stat().st_size if path.exists() else 0
+        pending = b""
+        while True:
+            if path.exists():
+                async with aiofiles.open(path, "rb") as f:
+                    await f.seek(offset)
+                    data = await f.read()
+                offset += len(data)
+                # Only complete lines are events; keep any trailing partial line for next time
+                *lines, pending = (pending + data).split(b"\n")
+                for line in lines:
+                    if line:
+                        event = json.loads(line)
+                        if predicate(event):
+                            return event
+            await asyncio.sleep(poll_interval)
+
+    return await asyncio.wait_for(follow(), timeout)
+
+@app.post("/webhook/github")
+async def github_webhook(
+    request: Request,
+    x_hub_signature_256: Optional[str] = Header(None),
+    x_github_event: Optional[str] = Header(None),
+    x_github_delivery: Optional[str] = Header(None)
+):
+    """Validates a GitHub delivery and records it for the platform to pick up"""
+    body = await request.body()
+    if not verify_signature(body, x_hub_signature_256, WEBHOOK_SECRET):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        # Signed but not JSON, e.g. a hook configured with the form content type
+        raise HTTPException(status_code=400, detail="Body is not valid JSON")
+
+    event = {
+        "delivery_id": x_github_delivery,
+        "event": x_github_event,
+        "payload": payload
+    }
+    await asyncio.to_thread(append_event, event)
+    # Acknowledge quickly; GitHub expects a response within 10 seconds
+    return {"status": "accepted"}